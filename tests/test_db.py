@@ -0,0 +1,114 @@
+import errno
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# app.py builds its module-level DB at import; keep it out of the working directory
+os.environ.setdefault("URL_DB_PATH", str(Path(tempfile.mkdtemp()) / "url_db.json"))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "urlshortener"))
+
+import app  # noqa: E402
+
+
+def _record(slug: str) -> dict:
+    return {
+        "slug": slug,
+        "target": "https://example.com/" + slug,
+        "created_at": app.dt_to_str(app.now_utc()),
+        "expires_at": "",
+        "secret": "secret",
+        "clicks": 0,
+        "last_access": None,
+    }
+
+
+def test_torn_journal_tail_is_truncated(tmp_path):
+    path = tmp_path / "url_db.json"
+    db = app.DB(path)
+    db.upsert("aaa", _record("aaa"))
+    db.flush()
+    with path.with_suffix(".jsonl").open("ab") as f:
+        f.write(b'{"op":"u","k":"zz')
+
+    db = app.DB(path)
+    assert set(db.data) == {"aaa"}
+    db.upsert("bbb", _record("bbb"))
+    db.flush()
+
+    assert set(app.DB(path).data) == {"aaa", "bbb"}
+
+
+def test_unreadable_snapshot_is_left_alone(tmp_path):
+    path = tmp_path / "url_db.json"
+    path.write_bytes(b'{"aaa": {"slug": "aa')
+
+    with pytest.raises(RuntimeError):
+        app.DB(path)
+    assert path.read_bytes() == b'{"aaa": {"slug": "aa'
+
+
+def test_idle_instance_does_not_compact_over_a_writer(tmp_path):
+    path = tmp_path / "url_db.json"
+    idle = app.DB(path)
+    writer = app.DB(path)
+    writer.upsert("aaa", _record("aaa"))
+    writer.flush()
+
+    idle._compact_if_written()
+
+    assert set(app.DB(path).data) == {"aaa"}
+
+
+def _disk_full(*args):
+    raise OSError(errno.ENOSPC, "No space left on device")
+
+
+class _FullDisk:
+    write = staticmethod(_disk_full)
+
+    def close(self):
+        pass
+
+
+def test_failed_journal_write_is_reported_and_retried(tmp_path, monkeypatch):
+    path = tmp_path / "url_db.json"
+    db = app.DB(path)
+    db._journal.close()
+    db._journal = _FullDisk()
+    monkeypatch.setattr(db, "_open_journal", _disk_full)
+
+    db.upsert("aaa", _record("aaa"))
+    db.flush()
+    assert db.last_error
+
+    monkeypatch.undo()
+    db.upsert("bbb", _record("bbb"))
+    db.flush()
+    assert db.last_error is None
+    assert set(app.DB(path).data) == {"aaa", "bbb"}
+
+
+def test_jsonl_db_path_gets_a_separate_journal(tmp_path):
+    path = tmp_path / "links.jsonl"
+    db = app.DB(path)
+    assert db.journal_path != path
+    db.upsert("aaa", _record("aaa"))
+    db.flush()
+    db.compact()
+    db.upsert("bbb", _record("bbb"))
+    db.flush()
+
+    assert set(app.DB(path).data) == {"aaa", "bbb"}
+
+
+def test_expiry_heap_stays_bounded_under_updates(tmp_path):
+    db = app.DB(tmp_path / "url_db.json")
+    db.upsert("aaa", {**_record("aaa"), "expires_at": "2999-01-01T00:00:00+00:00"})
+    for minute in range(1000):
+        db.update("aaa", expires_at=f"2999-01-01T{minute // 60:02d}:{minute % 60:02d}:00+00:00")
+
+    assert len(db._exp_heap) <= 2 * len(db._expires_ts) + 64
+    assert db.counts() == (1, 1)
@@ -9,10 +9,11 @@ Features
 - Edit/delete with a per-link secret key
 - Optional Google Analytics event on click via GTAG (GTAG_ID)
 - **Admin page** to list/search/manage/delete all links (requires ADMIN_TOKEN)
-- Stores data in a simple JSON text file (url_db.json)
+- Stores data in a simple JSON text file (url_db.json) plus an append-only
+  journal of recent changes (url_db.jsonl)
 
 Run:
-    pip install flask python-dotenv
+    pip install flask python-dotenv orjson
     python app.py
 
 Then open http://127.0.0.1:5000
@@ -26,16 +27,20 @@ Security & ethics notes:
 
 from __future__ import annotations
 
-import json
+import atexit
+import bisect
+import heapq
 import os
-import re
+import queue
 import secrets
 import string
 import threading
+import time
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Set, Tuple
 
+import orjson
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -57,6 +62,9 @@ DB_PATH = Path(os.environ.get("URL_DB_PATH", "url_db.json"))
 BASE_URL = os.environ.get("BASE_URL")  # Optional: e.g., https://sho.rt
 GTAG_ID = os.environ.get("GTAG_ID")    # Optional: e.g., G-XXXXXXXXXX
 ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")  # Required to access /admin
+# Optional: seconds browsers/proxies may cache redirects for links that never expire (0 = off)
+REDIRECT_MAX_AGE = int(os.environ.get("REDIRECT_MAX_AGE") or 0)
+_BASE_PREFIX = BASE_URL.rstrip("/") + "/" if BASE_URL else None
 
 # --- App setup ---
 app = Flask(__name__)
@@ -83,11 +91,15 @@ app.wsgi_app = ReverseProxied(app.wsgi_app)
 
 
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", secrets.token_urlsafe(32))
-_lock = threading.Lock()
 
 # --- Helpers ---
 SLUG_ALPHABET = string.ascii_letters + string.digits
-SLUG_RE = re.compile(r"^[A-Za-z0-9_-]{3,64}$")
+# Deletes every allowed custom-slug character; anything left over is invalid
+_SLUG_STRIP = str.maketrans("", "", SLUG_ALPHABET + "_-")
+# Random slugs to try at one length before moving to a longer one
+SLUG_ATTEMPTS = 8
+# Random bytes at or above this are rejected so ``b % len(SLUG_ALPHABET)`` stays unbiased
+_SLUG_BYTE_LIMIT = 256 - 256 % len(SLUG_ALPHABET)
 
 
 def now_utc() -> datetime:
@@ -117,43 +129,360 @@ def dt_from_str(s: str) -> Optional[datetime]:
         return None
 
 
+def _expiry_ts(s: str) -> float:
+    """POSIX timestamp for a stored expires_at; unparseable values count as already expired."""
+    try:
+        return datetime.fromisoformat(s).astimezone(timezone.utc).timestamp()
+    except Exception:
+        return 0.0
+
+
 class DB:
+    """In-memory dict backed by a JSON snapshot plus an append-only JSONL journal.
+
+    Each write appends one line to the journal instead of rewriting the whole
+    snapshot. On startup the snapshot is loaded and the journal replayed on top
+    of it; once the journal grows large enough it is folded back into a fresh
+    snapshot (see ``compact``), and at least once every ``COMPACT_INTERVAL``.
+
+    Mutations only hold ``_data_lock`` long enough to update ``data`` and queue
+    a journal entry; a single background writer drains the queue to disk under
+    ``_io_lock``, so request threads never wait on file I/O. Click stats are
+    counted in side columns and folded into records and the journal in batches
+    every ``FLUSH_INTERVAL`` seconds (see ``touch``), so records may show
+    slightly stale stats until then.
+
+    Once loaded, records are never mutated in place: every change replaces
+    the slot in ``data`` with a new dict. Readers can therefore take a cheap
+    list snapshot under the lock and use it after releasing it (see ``all``).
+    """
+
+    # Compact once the journal is this many times larger than the snapshot
+    COMPACT_RATIO = 4
+    # ... but never bother for journals smaller than this
+    COMPACT_MIN_BYTES = 64 * 1024
+    # Seconds between background flushes of pending click stats
+    FLUSH_INTERVAL = 5
+    # Seconds between background compactions of a non-empty journal
+    COMPACT_INTERVAL = 3600
+
     def __init__(self, path: Path):
         self.path = path
+        self.journal_path = path.with_suffix(".jsonl")
+        if self.journal_path == path:
+            # A .jsonl DB path would make the journal and snapshot the same file
+            self.journal_path = path.with_name(path.name + ".journal")
         self.data: Dict[str, dict] = {}
+        self._data_lock = threading.Lock()
+        self._io_lock = threading.RLock()
+        self._pending: queue.SimpleQueue = queue.SimpleQueue()
+        self._wakeup = threading.Event()
+        # Click stats not yet folded into their records: slug -> count, slug -> time.time()
+        self._clicks: Dict[str, int] = {}
+        self._last_access: Dict[str, float] = {}
+        # slug -> lowercased (slug, target, created_at) for admin search
+        self._search_index: Dict[str, Tuple[str, str, str]] = {}
+        # slug -> expires_at as a POSIX timestamp, only for links that expire
+        self._expires_ts: Dict[str, float] = {}
+        # Min-heap of (expires_ts, slug) still to be swept into _expired; may hold stale entries
+        self._exp_heap: List[Tuple[float, str]] = []
+        self._expired: Set[str] = set()
+        # (created_at, slug) for every record, oldest first
+        self._by_created: List[Tuple[str, str]] = []
+        # Bumped on every insert/update/delete; tags the cached all() listing
+        self._generation = 0
+        self._all_cache: Tuple[int, List[dict]] = (-1, [])
+        # Whether this instance has journaled anything since its last compaction
+        self._written = False
+        # Entries taken off _pending but not yet safely in the journal
+        self._unwritten: List[dict] = []
+        # Why the last journal write or compaction failed; None once one succeeds
+        self.last_error: Optional[str] = None
         self._load()
+        self._open_journal()
+        threading.Thread(target=self._writer_loop, name="db-writer", daemon=True).start()
 
     def _load(self):
         if self.path.exists():
             try:
-                self.data = json.loads(self.path.read_text("utf-8"))
-            except Exception:
-                # Attempt recovery from a partial write
-                backup = self.path.with_suffix(".bak")
-                if backup.exists():
-                    self.data = json.loads(backup.read_text("utf-8"))
-                else:
-                    self.data = {}
+                with self.path.open("rb") as f:
+                    self.data = orjson.loads(f.read())
+            except Exception as e:
+                # Refuse to start rather than let the next compaction overwrite it
+                raise RuntimeError(
+                    f"Can't read {self.path} ({e}). Restore it, or move it aside "
+                    f"to start from the journal ({self.journal_path.name}) alone."
+                ) from e
         else:
             self.data = {}
+        self._replay()
+        for slug, rec in self.data.items():
+            self._index(slug, rec)
+        self._by_created = sorted((rec["created_at"], slug) for slug, rec in self.data.items())
+        self._rebuild_exp_heap()
+
+    def _open_journal(self):
+        self._journal = self.journal_path.open("ab", buffering=1 << 16)
+        # Cut off any torn tail (from a crash or a failed write) so the next
+        # append starts on a fresh line
+        self._journal.truncate(self._journal_good)
+
+    def _close_broken_journal(self):
+        try:
+            self._journal.close()
+        except Exception:
+            pass
+        self._journal = None
+
+    def _replay(self):
+        # Byte length of the journal up to its last complete line
+        self._journal_good = 0
+        if not self.journal_path.exists():
+            return
+        with self.journal_path.open("rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # A torn final line from a crash mid-append; ignore it
+                    break
+                self._journal_good += len(line)
+                try:
+                    entry = orjson.loads(line)
+                except ValueError:
+                    continue
+                if entry["op"] == "u":
+                    self.data[entry["k"]] = entry["v"]
+                elif entry["op"] == "d":
+                    self.data.pop(entry["k"], None)
+                elif entry["op"] == "c" and entry["k"] in self.data:
+                    rec = self.data[entry["k"]]
+                    rec["clicks"] = entry["n"]
+                    rec["last_access"] = entry["t"]
+
+    def _index(self, slug: str, rec: dict):
+        self._search_index[slug] = (
+            rec.get("slug", "").lower(),
+            rec.get("target", "").lower(),
+            (rec.get("created_at", "") or "").lower(),
+        )
+        ts = _expiry_ts(rec["expires_at"]) if rec.get("expires_at") else None
+        if ts == self._expires_ts.get(slug):
+            return
+        self._expired.discard(slug)
+        if ts is None:
+            del self._expires_ts[slug]
+        else:
+            self._expires_ts[slug] = ts
+            heapq.heappush(self._exp_heap, (ts, slug))
+            self._prune_exp_heap()
+
+    def _unindex(self, slug: str):
+        del self._search_index[slug]
+        self._expires_ts.pop(slug, None)
+        self._expired.discard(slug)
+        self._prune_exp_heap()
+
+    def _prune_exp_heap(self):
+        # Drop stale heap entries left behind by deletes and changed expiries
+        if len(self._exp_heap) > 2 * len(self._expires_ts) + 64:
+            self._rebuild_exp_heap()
+
+    def _rebuild_exp_heap(self):
+        self._exp_heap = [(ts, slug) for slug, ts in self._expires_ts.items() if slug not in self._expired]
+        heapq.heapify(self._exp_heap)
+
+    def _sweep_expired(self, now: float):
+        """Move links whose expiry has passed from the heap into ``_expired``."""
+        heap = self._exp_heap
+        while heap and heap[0][0] <= now:
+            ts, slug = heapq.heappop(heap)
+            # Skip entries superseded by a later update or delete
+            if self._expires_ts.get(slug) == ts:
+                self._expired.add(slug)
+
+    def _order(self, slug: str, old: Optional[dict], rec: Optional[dict]):
+        """Keep ``_by_created`` sorted as ``slug`` changes from ``old`` to ``rec``."""
+        if old is not None:
+            if rec is not None and rec["created_at"] == old["created_at"]:
+                return
+            key = (old["created_at"], slug)
+            i = bisect.bisect_left(self._by_created, key)
+            if i < len(self._by_created) and self._by_created[i] == key:
+                del self._by_created[i]
+        if rec is not None:
+            key = (rec["created_at"], slug)
+            # New links are almost always the newest, so appending is the common case
+            if not self._by_created or key > self._by_created[-1]:
+                self._by_created.append(key)
+            else:
+                bisect.insort(self._by_created, key)
 
     def _save(self):
-        # Atomic-ish write: write to .tmp then rename, keep .bak
+        # Atomic write: fsync a .tmp file, rename it over the DB, fsync the directory
         tmp = self.path.with_suffix(".tmp")
-        bak = self.path.with_suffix(".bak")
-        tmp.write_text(json.dumps(self.data, indent=2, sort_keys=True), "utf-8")
-        if self.path.exists():
-            self.path.replace(bak)
-        tmp.replace(self.path)
+        # Records are replaced, never mutated, so a shallow copy is a consistent
+        # snapshot and encoding it needn't block writers
+        with self._data_lock:
+            snapshot = dict(self.data)
+        # No OPT_SORT_KEYS: dict order is already deterministic (insertion/replay order)
+        payload = orjson.dumps(snapshot, option=orjson.OPT_INDENT_2)
+        with tmp.open("wb", buffering=1 << 20) as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        # Make the rename itself durable before compact() truncates the journal
+        if os.name == "posix":
+            fd = os.open(self.path.parent, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _enqueue(self, entry: dict):
+        # Caller holds _data_lock so entries are queued in mutation order
+        self._pending.put(entry)
+        self._wakeup.set()
+
+    def _drain(self):
+        """Write every queued journal entry to disk.
+
+        On failure the entries stay in ``_unwritten`` and are retried on the
+        next drain; ``last_error`` reports the problem until then.
+        """
+        with self._io_lock:
+            while True:
+                try:
+                    self._unwritten.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            if not self._unwritten:
+                return
+            try:
+                if self._journal is None:
+                    self._open_journal()
+                self._journal.write(b"".join(orjson.dumps(entry) + b"\n" for entry in self._unwritten))
+                self._journal.flush()
+            except Exception as e:
+                app.logger.exception("Writing to %s failed; will retry", self.journal_path)
+                self.last_error = f"journal write failed: {e}"
+                if self._journal is not None:
+                    self._close_broken_journal()
+                return
+            self._journal_good = self._journal.tell()
+            self._unwritten.clear()
+            self._written = True
+            self.last_error = None
+            if self._journal_good > max(self.COMPACT_MIN_BYTES, self.COMPACT_RATIO * self._snapshot_size()):
+                self.compact()
+
+    def _snapshot_size(self) -> int:
+        try:
+            return self.path.stat().st_size
+        except OSError:
+            return 0
+
+    def compact(self):
+        """Fold the journal into a fresh snapshot and truncate it."""
+        with self._io_lock:
+            try:
+                self._save()
+                if self._journal is None:
+                    self._open_journal()
+                self._journal.seek(0)
+                self._journal.truncate()
+            except Exception as e:
+                # The journal still holds everything; compaction is retried later
+                app.logger.exception("Compacting %s failed", self.path)
+                self.last_error = f"compaction failed: {e}"
+                return
+            self._journal_good = 0
+            self._written = False
+
+    def _compact_if_written(self):
+        # Only compact what this instance wrote. Another process sharing the
+        # files (e.g. the debug reloader's parent) must not replace the
+        # snapshot with its stale copy and truncate the live journal.
+        with self._io_lock:
+            if self._written:
+                self.compact()
+
+    def _writer_loop(self):
+        last_flush = last_compact = time.monotonic()
+        while True:
+            self._wakeup.wait(self.FLUSH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                if time.monotonic() - last_flush >= self.FLUSH_INTERVAL:
+                    last_flush = time.monotonic()
+                    self._flush_clicks()
+                self._drain()
+                if time.monotonic() - last_compact >= self.COMPACT_INTERVAL:
+                    last_compact = time.monotonic()
+                    self._compact_if_written()
+            except Exception as e:
+                # Keep the writer alive; anything still queued is retried next tick
+                app.logger.exception("DB writer failed")
+                self.last_error = f"writer failed: {e}"
+
+    def _flush_clicks(self):
+        """Fold pending click stats into their records and queue them for the journal."""
+        with self._data_lock:
+            for slug, clicks in self._clicks.items():
+                rec = self.data.get(slug)
+                if rec is None:
+                    continue
+                last_access = dt_to_str(datetime.fromtimestamp(self._last_access[slug], timezone.utc))
+                self.data[slug] = {**rec, "clicks": clicks, "last_access": last_access}
+                self._enqueue({"op": "c", "k": slug, "n": clicks, "t": last_access})
+            if self._clicks:
+                self._generation += 1
+            self._clicks.clear()
+            self._last_access.clear()
+
+    def flush(self):
+        """Synchronously write pending click stats and queued entries to disk."""
+        self._flush_clicks()
+        self._drain()
 
     def upsert(self, slug: str, record: dict):
-        self.data[slug] = record
-        self._save()
+        with self._data_lock:
+            self._order(slug, self.data.get(slug), record)
+            self.data[slug] = record
+            self._generation += 1
+            self._index(slug, record)
+            self._enqueue({"op": "u", "k": slug, "v": record})
+
+    def update(self, slug: str, **fields):
+        """Replace ``slug``'s record with a copy carrying ``fields``."""
+        with self._data_lock:
+            rec = self.data.get(slug)
+            if rec is None:
+                return
+            old, rec = rec, {**rec, **fields}
+            self._order(slug, old, rec)
+            self.data[slug] = rec
+            self._generation += 1
+            self._index(slug, rec)
+            self._enqueue({"op": "u", "k": slug, "v": rec})
 
     def delete(self, slug: str):
-        if slug in self.data:
-            del self.data[slug]
-            self._save()
+        with self._data_lock:
+            if slug in self.data:
+                self._order(slug, self.data.pop(slug), None)
+                self._generation += 1
+                self._unindex(slug)
+                self._clicks.pop(slug, None)
+                self._last_access.pop(slug, None)
+                self._enqueue({"op": "d", "k": slug})
+
+    def touch(self, slug: str):
+        """Record a click in memory only; it reaches the record and disk on the next flush."""
+        with self._data_lock:
+            rec = self.data.get(slug)
+            if rec is None:
+                return
+            self._clicks[slug] = self._clicks.get(slug, rec.get("clicks", 0)) + 1
+            self._last_access[slug] = time.time()
 
     def get(self, slug: str) -> Optional[dict]:
         return self.data.get(slug)
@@ -161,26 +490,74 @@ class DB:
     def exists(self, slug: str) -> bool:
         return slug in self.data
 
-    def all(self):
-        # Return newest first
-        return sorted(self.data.values(), key=lambda r: r["created_at"], reverse=True)
+    def all(self) -> List[dict]:
+        # Return newest first; the list is shared between calls, so don't mutate it.
+        # It is a snapshot: only building it holds the lock, never iterating it.
+        with self._data_lock:
+            generation, items = self._all_cache
+            if generation != self._generation:
+                items = [self.data[slug] for _, slug in reversed(self._by_created)]
+                self._all_cache = (self._generation, items)
+            return items
+
+    def is_expired(self, slug: str) -> bool:
+        ts = self._expires_ts.get(slug)
+        return ts is not None and time.time() >= ts
+
+    def counts(self) -> Tuple[int, int]:
+        """``(total, active)`` link counts, taken together under the lock."""
+        with self._data_lock:
+            self._sweep_expired(time.time())
+            return len(self.data), len(self.data) - len(self._expired)
+
+    def search(self, q: str) -> List[dict]:
+        """Records whose slug, target or created_at contain lowercase ``q``, newest first."""
+        # Scan the all() snapshot without holding the lock; index entries are
+        # immutable tuples, and a missing one means the link was just deleted
+        index = self._search_index
+        hits = []
+        for rec in self.all():
+            cols = index.get(rec["slug"])
+            if cols and (q in cols[0] or q in cols[1] or q in cols[2]):
+                hits.append(rec)
+        return hits
 
 
 db = DB(DB_PATH)
+atexit.register(db.flush)
+
+
+def _random_slug(length: int) -> str:
+    # One urandom read per slug rather than one per character via secrets.choice
+    n = len(SLUG_ALPHABET)
+    chars = []
+    while len(chars) < length:
+        chars.extend(SLUG_ALPHABET[b % n] for b in secrets.token_bytes(length * 2) if b < _SLUG_BYTE_LIMIT)
+    return "".join(chars[:length])
 
 
 def generate_slug(length: int = 6) -> str:
-    for _ in range(100):
-        slug = "".join(secrets.choice(SLUG_ALPHABET) for _ in range(length))
-        if not db.exists(slug):
-            return slug
-    # fallback: enlarge length
-    return generate_slug(length + 1)
+    while True:
+        for _ in range(SLUG_ATTEMPTS):
+            slug = _random_slug(length)
+            if not db.exists(slug):
+                return slug
+        # This length is crowded enough that retries keep colliding; enlarge it
+        length += 1
+
+
+def _url_prefix() -> str:
+    # Constant when BASE_URL is configured; otherwise derived from the request
+    return _BASE_PREFIX or request.host_url.rstrip("/") + "/"
+
+
+def is_valid_slug(slug: str) -> bool:
+    # 3–64 characters of letters, digits, underscore or hyphen
+    return 3 <= len(slug) <= 64 and not slug.translate(_SLUG_STRIP)
 
 
 def is_valid_url(url: str) -> bool:
-    url = (url or "").strip()
-    return url.startswith("http://") or url.startswith("https://")
+    return (url or "").strip().startswith(("http://", "https://"))
 
 
 # --- Public routes ---
@@ -212,7 +589,7 @@ def create():
 
     # Validate/assign slug
     if slug:
-        if not SLUG_RE.match(slug):
+        if not is_valid_slug(slug):
             flash("Custom slug must be 3–64 characters of letters, numbers, underscore, or hyphen.")
             return render_template("index.html", title=APP_TITLE, app_title=APP_TITLE, created=None)
         if db.exists(slug):
@@ -239,10 +616,9 @@ def create():
         "last_access": None,
     }
 
-    with _lock:
-        db.upsert(slug, record)
+    db.upsert(slug, record)
 
-    full_url = (BASE_URL.rstrip("/") if BASE_URL else request.host_url.rstrip("/")) + "/" + slug
+    full_url = _url_prefix() + slug
     created = {**record, "full_url": full_url}
 
     flash("Short link created. Save your secret key to edit or delete it.")
@@ -277,7 +653,7 @@ def manage(slug: Optional[str] = None):
             expires_date_input = ""
             expires_time_input = ""
 
-    full_url = (BASE_URL.rstrip("/") if BASE_URL else request.host_url.rstrip("/")) + "/" + slug
+    full_url = _url_prefix() + slug
 
     return render_template(
         "manage_edit.html",
@@ -300,8 +676,7 @@ def manage_post(slug: str):
 
     action = (request.form.get("action") or "update").strip().lower()
     if action == "delete":
-        with _lock:
-            db.delete(slug)
+        db.delete(slug)
         flash("Link deleted.")
         return redirect(url_for("index"))
 
@@ -322,49 +697,59 @@ def manage_post(slug: str):
         flash("Please provide a target that starts with http:// or https://")
         return redirect(url_for("manage", slug=slug, key=key))
 
-    with _lock:
-        rec["target"] = target
-        rec["expires_at"] = dt_to_str(expires_at)
-        db.upsert(slug, rec)
+    db.update(slug, target=target, expires_at=dt_to_str(expires_at))
 
     flash("Changes saved.")
     return redirect(url_for("manage", slug=slug, key=key))
 
 
-@app.get("/<slug>")
-def go(slug: str):
+def _resolve(slug: str):
+    """Look up a live link and count the click.
+
+    Returns ``(rec, None)``, or ``(None, response)`` when the link is missing or expired.
+    """
     rec = db.get(slug)
     if not rec:
-        return render_template("notfound.html", title="Not found"), 404
+        return None, (render_template("notfound.html", title="Not found"), 404)
 
-    # Check expiration
-    if rec.get("expires_at"):
-        try:
-            exp = datetime.fromisoformat(rec["expires_at"]).astimezone(timezone.utc)
-            if now_utc() >= exp:
-                return render_template("gone.html", title="Expired"), 410
-        except Exception:
-            # On parse error, treat as expired to be safe.
-            return render_template("gone.html", title="Expired"), 410
-
-    # Increment stats first
-    with _lock:
-        rec["clicks"] = int(rec.get("clicks", 0)) + 1
-        rec["last_access"] = dt_to_str(now_utc())
-        db.upsert(slug, rec)
-
-    # If GTAG_ID is configured, render a lightweight page that fires GA and then redirects
-    if GTAG_ID:
-        return render_template(
-            "track_and_redirect.html",
-            title="Redirecting…",
-            gtag_id=GTAG_ID,
-            slug=slug,
-            target=rec["target"],
-        )
+    # Check expiration (unparseable expiries count as expired, to be safe)
+    if db.is_expired(slug):
+        return None, (render_template("gone.html", title="Expired"), 410)
 
-    # Otherwise, redirect immediately
-    return redirect(rec["target"], code=302)
+    # Increment stats first (persisted in batches by the DB flush thread)
+    db.touch(slug)
+    return rec, None
+
+
+def _go_with_gtag(slug: str):
+    # Render a lightweight page that fires GA and then redirects
+    rec, error = _resolve(slug)
+    if error:
+        return error
+    return render_template(
+        "track_and_redirect.html",
+        title="Redirecting…",
+        gtag_id=GTAG_ID,
+        slug=slug,
+        target=rec["target"],
+    )
+
+
+def _go_redirect(slug: str):
+    # Redirect immediately
+    rec, error = _resolve(slug)
+    if error:
+        return error
+    response = redirect(rec["target"], code=302)
+    if REDIRECT_MAX_AGE and not rec.get("expires_at"):
+        # Let caches answer repeat hits; edits/deletes reach them once this lapses.
+        # Still a 302: targets can be edited, so the move is never permanent.
+        response.headers["Cache-Control"] = f"public, max-age={REDIRECT_MAX_AGE}"
+    return response
+
+
+# GTAG_ID is fixed at startup, so pick the redirect flavour once rather than per hit
+app.add_url_rule("/<slug>", "go", _go_with_gtag if GTAG_ID else _go_redirect, methods=["GET"])
 
 
 # --- Admin routes ---
@@ -386,19 +771,10 @@ def _require_admin():
 def admin_index():
     _require_admin()
     q = (request.args.get("q") or "").strip().lower()
-    items = db.all()
-    if q:
-        def matches(r: dict) -> bool:
-            return (
-                q in r.get("slug", "").lower()
-                or q in r.get("target", "").lower()
-                or q in (r.get("created_at", "") or "").lower()
-            )
-        items = [r for r in items if matches(r)]
+    items = db.search(q) if q else db.all()
 
     # Simple counts
-    total = len(db.data)
-    active = sum(1 for r in db.data.values() if not r.get("expires_at") or now_utc() < datetime.fromisoformat(r["expires_at"]))
+    total, active = db.counts()
     expired = total - active
 
     return render_template(
@@ -418,8 +794,7 @@ def admin_delete(slug: str):
     if not db.get(slug):
         flash("No such slug.")
         return redirect(url_for("admin_index"))
-    with _lock:
-        db.delete(slug)
+    db.delete(slug)
     flash(f"Deleted {slug}.")
     return redirect(url_for("admin_index"))
 
@@ -438,7 +813,11 @@ def admin_impersonate(slug: str):
 # Optional: simple health check
 @app.get("/healthz")
 def healthz():
-    return {"ok": True, "count": len(db.data)}
+    ok = db.last_error is None
+    body = {"ok": ok, "count": len(db.data)}
+    if not ok:
+        body["error"] = db.last_error
+    return body, 200 if ok else 503, {"Cache-Control": "max-age=5"}
 
 
 if __name__ == "__main__":